@@ -0,0 +1,87 @@
+# On-disk cache for transcripts and summaries, keyed by YouTube video ID
+import hashlib
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+CACHE_DIR = Path(".ytcache")                    # Directory holding cached transcripts and summaries
+HASH_SAMPLE_BYTES = 1 << 20                     # Only the first MB of the model file is hashed, for speed
+VIDEO_ID_PATTERN = re.compile(r"^[\w-]{11}$")   # YouTube video IDs are 11 URL-safe characters
+YOUTUBE_HOSTS = ("youtube.com", "youtu.be", "youtube-nocookie.com")
+VIDEO_PATH_PREFIXES = ("shorts", "embed", "live", "v")   # youtube.com/<prefix>/<id> paths
+
+
+def video_id(url: str) -> str:
+    """
+    Extracts the video ID from a YouTube URL.
+
+    Args:
+        url (str): A youtube.com/watch, youtu.be, /shorts/, /embed/, /live/ or /v/ URL.
+
+    Returns:
+        str: The 11-character video ID.
+
+    Raises:
+        ValueError: If the URL is not a YouTube URL or no video ID can be found in it.
+    """
+    parsed = urlparse(url if "//" in url else f"https://{url}")
+    host = (parsed.hostname or "").lower()
+    if not any(host == domain or host.endswith(f".{domain}") for domain in YOUTUBE_HOSTS):
+        raise ValueError(f"Not a YouTube URL: {url}")
+    parts = [part for part in parsed.path.split("/") if part]
+    if host == "youtu.be" or host.endswith(".youtu.be"):
+        candidates = parts[:1]                  # youtu.be/<id>
+    else:
+        candidates = parse_qs(parsed.query).get("v", [])[:1]
+        if len(parts) >= 2 and parts[0] in VIDEO_PATH_PREFIXES:
+            candidates.append(parts[1])         # /shorts/<id>, /embed/<id>, ...
+    for candidate in candidates:
+        if VIDEO_ID_PATTERN.match(candidate):
+            return candidate
+    raise ValueError(f"Could not find a YouTube video ID in {url}")
+
+
+@lru_cache(maxsize=None)
+def model_hash(model_path: str) -> str:
+    """Returns a short hash of the model file, sampled from its first MB."""
+    with open(model_path, "rb") as f:
+        return hashlib.sha256(f.read(HASH_SAMPLE_BYTES)).hexdigest()[:16]
+
+
+def prompt_hash(prompt: str) -> str:
+    """Returns a short hash of a prompt template."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def load_transcript(video_id: str) -> Optional[str]:
+    """Returns the cached transcript for a video, or None on a cache miss."""
+    path = CACHE_DIR / f"{video_id}.txt"
+    return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+def save_transcript(video_id: str, transcript: str) -> None:
+    """Stores a video's transcript in the cache."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    (CACHE_DIR / f"{video_id}.txt").write_text(transcript, encoding="utf-8")
+
+
+def audio_path(video_id: str) -> Path:
+    """Returns where a video's 16kHz mono WAV is cached (the file may not exist yet)."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    return CACHE_DIR / f"{video_id}.wav"
+
+
+def load_summary(video_id: str, model_hash: str, prompt_hash: str) -> Optional[str]:
+    """Returns the cached summary for a video/model/prompt combination, or None on a cache miss."""
+    path = CACHE_DIR / f"{video_id}-{model_hash}-{prompt_hash}.json"
+    return json.loads(path.read_text(encoding="utf-8"))["summary"] if path.exists() else None
+
+
+def save_summary(video_id: str, model_hash: str, prompt_hash: str, summary: str) -> None:
+    """Stores a summary in the cache."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    path = CACHE_DIR / f"{video_id}-{model_hash}-{prompt_hash}.json"
+    path.write_text(json.dumps({"summary": summary}), encoding="utf-8")
@@ -1,10 +1,125 @@
-from llama_cpp import Llama
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+from llama_cpp import GGML_TYPE_Q8_0, Llama, llama_supports_gpu_offload
+from llama_cpp.llama_speculative import LlamaDraftModel
+
+logger = logging.getLogger(__name__)
+
+N_CTX = 4096                                   # Context window passed explicitly so llama.cpp does not re-probe the GGUF
+N_BATCH = 512                                  # Prompt-processing batch size
+N_DRAFT = 8                                    # Tokens proposed by the draft model per speculative step
+MAX_LENGTH = 256                               # Summaries rarely need more; decode time grows per token
+STOP = ["\n\n[INST]", "</s>"]                  # End generation as soon as the model starts a new turn
+N_THREADS = max(1, (os.cpu_count() or 2) - 1)  # Token generation: leave a core for the rest of the app
+N_THREADS_BATCH = os.cpu_count() or 1          # Prompt prefill is compute-bound: use every core
+KV_CACHE_TYPE = GGML_TYPE_Q8_0                 # int8 KV cache: half the bytes streamed per decoded token
+SENTINEL = "\n"                                # Tokenized ahead of prompt fragments so no leading space is added
+CUDA_REBUILD_CMD = 'CMAKE_ARGS="-DGGML_CUDA=on -DGGML_CUDA_F16=on -DGGML_CUDA_FA_ALL_QUANTS=on" pip install llama-cpp-python --force-reinstall --no-cache-dir'
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """Speculative-decoding draft backed by a small GGUF model sharing the main model's vocabulary."""
+
+    def __init__(self, model_path: str, n_draft: int = N_DRAFT, **kwargs):
+        self.model = Llama(model_path=model_path, verbose=False, **kwargs)
+        self.n_draft = n_draft
+
+    def __call__(self, input_ids, /, **kwargs):
+        # Greedy-decode a few tokens; generate() reuses the KV cache for the shared prefix
+        draft = []
+        for token in self.model.generate(input_ids.tolist(), top_k=1, temp=0.0):
+            if token == self.model.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= self.n_draft:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+@lru_cache(maxsize=4)
+def _get_llama(model_path: str, use_gpu: bool, n_ctx: int = N_CTX, n_batch: int = N_BATCH,
+               offload_kqv: bool = True, draft_path: Optional[str] = None, n_draft: int = N_DRAFT,
+               flash_attn: bool = True, kv_cache_type: Optional[int] = KV_CACHE_TYPE) -> Llama:
+    """Return a shared Llama instance so the weights are mmap'd once per process."""
+    n_gpu_layers = -1 if use_gpu else 0       # -1 offloads every layer to the GPU
+    draft_model = None
+    if draft_path:
+        draft_model = GGUFDraftModel(draft_path, n_draft, n_gpu_layers=n_gpu_layers, n_ctx=n_ctx, n_batch=n_batch,
+                                     n_threads=N_THREADS, n_threads_batch=N_THREADS_BATCH)
+    return Llama(
+        model_path=model_path,
+        n_gpu_layers=n_gpu_layers,
+        n_ctx=n_ctx,
+        n_batch=n_batch,
+        n_threads=N_THREADS,
+        n_threads_batch=N_THREADS_BATCH,
+        offload_kqv=offload_kqv,
+        flash_attn=flash_attn,                 # Fused attention kernel: less KQV memory traffic on long prompts
+        type_k=kv_cache_type,
+        type_v=kv_cache_type if flash_attn else None,  # llama.cpp can only quantize the V cache with flash_attn
+        use_mlock=True,
+        draft_model=draft_model,
+    )
+
+
+@lru_cache(maxsize=4)
+def _get_lock(model: Llama) -> threading.Lock:
+    """Return the lock serialising access to a shared Llama context (one per cached model)."""
+    return threading.Lock()
+
 
 class LlamaCPPInvocationLayer:
-    def __init__(self, model_path, use_gpu=False, max_length=512):
-        self.model = Llama(model_path=model_path, n_gpu_layers=1 if use_gpu else 0)
+    def __init__(self, model_path, use_gpu=None, max_length=MAX_LENGTH, n_ctx=N_CTX, n_batch=N_BATCH,
+                 offload_kqv=True, draft_path=None, n_draft=N_DRAFT, prompt_template=None, flash_attn=True,
+                 kv_cache_type=KV_CACHE_TYPE):
+        if use_gpu is None:                      # Auto-detect: offload if llama.cpp was built with GPU support
+            use_gpu = llama_supports_gpu_offload()
+        elif use_gpu and not llama_supports_gpu_offload():
+            logger.warning("llama-cpp-python was built without GPU support; the model will run on the CPU. "
+                           "Rebuild it with: %s", CUDA_REBUILD_CMD)
+        self.model = _get_llama(model_path, use_gpu, n_ctx, n_batch, offload_kqv, draft_path, n_draft, flash_attn,
+                                kv_cache_type)
+        self._lock = _get_lock(self.model)      # Streamlit sessions share the cached model across threads
         self.max_length = max_length
+        self.prompt_template = prompt_template
+        self._pretokenized = False
+        if prompt_template:
+            # Tokenize the fixed parts of the template once; only {text} is tokenized per call
+            prefix, _, suffix = prompt_template.partition("{text}")
+            self._sentinel_tokens = self.model.tokenize(SENTINEL.encode("utf-8"), add_bos=False)
+            self._prefix_tokens = self.model.tokenize(prefix.encode("utf-8"))
+            self._suffix_tokens = self._tokenize_fragment(suffix)
+            # Splicing is only safe if it reproduces the tokenization of the formatted template
+            sample = "A sample transcript."
+            full = self.model.tokenize(prompt_template.format(text=sample).encode("utf-8"))
+            self._pretokenized = self._splice(sample) == full
+            if not self._pretokenized:
+                logger.warning("Pre-tokenized prompt template does not match the full prompt; "
+                               "tokenizing the whole prompt on every call instead.")
+
+    def _tokenize_fragment(self, text: str) -> List[int]:
+        """Tokenize text that continues a prompt, without the leading space the SPM tokenizer adds."""
+        tokens = self.model.tokenize((SENTINEL + text).encode("utf-8"), add_bos=False)
+        return tokens[len(self._sentinel_tokens):]
+
+    def _splice(self, text: str) -> List[int]:
+        return self._prefix_tokens + self._tokenize_fragment(text) + self._suffix_tokens
 
     def __call__(self, prompt: str):
-        response = self.model(prompt=prompt, max_tokens=self.max_length)
+        """
+        Generate a completion. With a prompt_template, prompt is the text substituted
+        for {text}; otherwise it is the full prompt.
+        """
+        if self._pretokenized:
+            # Every call shares the template head, so llama.cpp's prefix matching skips re-prefilling it
+            prompt = self._splice(prompt)
+        elif self.prompt_template:
+            prompt = self.prompt_template.format(text=prompt)
+        with self._lock:
+            response = self.model(prompt=prompt, max_tokens=self.max_length, stop=STOP)
         return response.get('choices', [{}])[0].get('text', '')
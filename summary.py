@@ -1,68 +1,81 @@
 # Import necessary libraries for video/audio processing and summarization
-from pytube import YouTube
-from haystack.nodes import PromptNode, PromptModel
-from haystack.nodes.audio import WhisperTranscriber
-from haystack.pipelines import Pipeline
+import logging
+from functools import lru_cache
+from typing import List
+from cache import load_summary, load_transcript, model_hash, prompt_hash, save_summary, save_transcript, video_id
+from transcriber import FasterWhisperTranscriber
 from model_add import LlamaCPPInvocationLayer
 
 # Constants for model configuration
-SUMMARY_PROMPT = "deepset/summarization"        # Summarization prompt template identifier
-MODEL_PATH = "llama-2-7b-32k-instruct.Q4_K_S.gguf"  # Path to model weights
-MODEL_MAX_LENGTH = 512                         # Maximum allowed summary length for the model
+SUMMARY_PROMPT = "[INST] Summarize the following transcript concisely:\n\n{text} [/INST]"  # Summarization prompt template
+MODEL_PATH = "llama-2-7b-32k-instruct.Q4_K_M.gguf"  # Path to model weights
+DRAFT_MODEL_PATH = None                        # Optional small GGUF (e.g. TinyLlama-1.1B) for speculative decoding
+MODEL_MAX_LENGTH = 256                         # Maximum allowed summary length for the model
+CHUNK_TOKENS = 1500                            # Transcript tokens per map-step chunk
+CHUNK_OVERLAP = 100                            # Tokens shared between neighbouring chunks
 
-def youtube_to_audio(url: str, abr: str = '160kbps') -> str:
+@lru_cache(maxsize=1)
+def get_transcriber() -> FasterWhisperTranscriber:
+    """Returns the shared Whisper model, loading it on first use."""
+    return FasterWhisperTranscriber()
+
+def get_transcript(vid: str) -> str:
     """
-    Downloads the audio stream of a YouTube video at the given URL and specified audio bitrate.
-    Returns the local path to the downloaded audio file.
+    Returns the transcript of a YouTube video, transcribing it only on a cache miss.
 
     Args:
-        url (str): The YouTube video URL.
-        abr (str): Audio bitrate as a filter, default is '160kbps'.
+        vid (str): The YouTube video ID.
 
     Returns:
-        str: Filepath of the downloaded audio.
+        str: The transcript (empty if nothing was recognised).
+    """
+    transcript = load_transcript(vid)
+    if transcript is None:
+        transcript = get_transcriber().transcribe_stream(f"https://www.youtube.com/watch?v={vid}")
+        if transcript:
+            save_transcript(vid, transcript)
+    return transcript
 
-    Raises:
-        ValueError: If no stream matches the specified bitrate.
+def chunk_text(text: str, llm: LlamaCPPInvocationLayer, size: int = CHUNK_TOKENS,
+               overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
-    yt = YouTube(url)
-    stream = yt.streams.filter(abr=abr).last()   # Get the last audio stream with specified bitrate
-    if not stream:                               # Error handling for unavailable bitrate
-        raise ValueError(f"No audio stream with {abr} available.")
-    return stream.download()                      # Download and return the file path
+    Splits text into overlapping chunks that fit the model's context window.
 
-def build_pipeline(model_path: str, max_length: int, use_gpu: bool = False) -> Pipeline:
+    Args:
+        text (str): The text to split.
+        llm (LlamaCPPInvocationLayer): Model whose tokenizer is used to measure chunk sizes.
+        size (int): Maximum number of tokens per chunk.
+        overlap (int): Number of tokens repeated at the start of each following chunk.
+
+    Returns:
+        List[str]: The text chunks, in order.
     """
-    Constructs a Haystack pipeline for audio transcription and summarization.
+    tokens = llm.model.tokenize(text.encode("utf-8"), add_bos=False)
+    step = size - overlap
+    return [
+        llm.model.detokenize(tokens[i:i + size]).decode("utf-8", errors="ignore")
+        for i in range(0, max(len(tokens) - overlap, 1), step)
+    ]
+
+def summarize_transcript(text: str, llm: LlamaCPPInvocationLayer) -> str:
+    """
+    Summarizes a transcript of any length with a sequential map-reduce pass.
+
+    Each chunk is summarized in turn (map), then the partial summaries are joined
+    and summarized again (reduce) until they fit in a single chunk.
 
     Args:
-        model_path (str): Path to the pre-trained language model weights.
-        max_length (int): Maximum response length for model inference.
-        use_gpu (bool): If True, use GPU for inference.
+        text (str): The transcript to summarize.
+        llm (LlamaCPPInvocationLayer): The summarization model, built with prompt_template=SUMMARY_PROMPT.
 
     Returns:
-        Pipeline: Configured Haystack pipeline.
+        str: The final summary.
     """
-    # Create an audio transcriber node (Whisper)
-    whisper = WhisperTranscriber()
-    # Prepare the summarization model node with LlamaCPP invocation
-    model = PromptModel(
-        model_name_or_path=model_path,
-        invocation_layer_class=LlamaCPPInvocationLayer,
-        use_gpu=use_gpu,
-        max_length=max_length
-    )
-    # Wrap model in a prompt node for flexible prompt-based summarization
-    prompt_node = PromptNode(
-        model_name_or_path=model,
-        default_prompt_template=SUMMARY_PROMPT,
-        use_gpu=use_gpu
-    )
-    # Build the pipeline with two nodes: transcriber and summarizer
-    pipeline = Pipeline()
-    pipeline.add_node(component=whisper, name="whisper", inputs=["File"])
-    pipeline.add_node(component=prompt_node, name="prompt", inputs=["whisper"])
-    return pipeline
+    chunks = chunk_text(text, llm)
+    summaries = [llm(chunk) for chunk in chunks]  # The layer splices each chunk into SUMMARY_PROMPT
+    if len(summaries) == 1:
+        return summaries[0]
+    return summarize_transcript("\n".join(summaries), llm)
 
 def main(url: str):
     """
@@ -72,24 +85,35 @@ def main(url: str):
         url (str): The YouTube video URL to process.
     """
     try:
-        # Step 1: Download audio from YouTube
-        file_path = youtube_to_audio(url)
-    except Exception as e:
-        print(f"Failed to fetch audio: {e}")      # Print errors (e.g., no matching stream)
+        vid = video_id(url)
+    except ValueError as e:
+        print(e)                                  # Not a recognisable YouTube URL
         return
 
-    # Step 2: Build summarization pipeline using configured model
-    pipeline = build_pipeline(MODEL_PATH, MODEL_MAX_LENGTH)
-    # Step 3: Run pipeline to get transcription + summary results
-    output = pipeline.run(file_paths=[file_path])
-    results = output.get("results", [])
-    if results:
-        print(results)                            # Print full output results for debugging
-        print(results[0].split("\n\n[INST]")[0])  # Extract and print the main summary
-    else:
-        print("No results produced by pipeline.") # Informative message for empty outputs
+    # Step 1: Serve a cached summary for this video, model and prompt if there is one
+    summary_key = (vid, model_hash(MODEL_PATH), prompt_hash(SUMMARY_PROMPT))
+    summary = load_summary(*summary_key)
+    if summary is None:
+        try:
+            # Step 2: Stream the audio from YouTube into faster-whisper (or read the cached transcript)
+            transcript = get_transcript(vid)
+        except Exception as e:
+            print(f"Failed to transcribe audio: {e}")  # Print errors (e.g., download failures)
+            return
+        if not transcript:
+            print("No transcript produced.")      # Informative message for empty outputs
+            return
+
+        # Step 3: Map-reduce summarize the transcript using configured model
+        llm = LlamaCPPInvocationLayer(MODEL_PATH, max_length=MODEL_MAX_LENGTH, draft_path=DRAFT_MODEL_PATH,
+                                     prompt_template=SUMMARY_PROMPT)
+        summary = summarize_transcript(transcript, llm)
+        if summary:
+            save_summary(*summary_key, summary)
+    print(summary.partition("\n\n[INST]")[0])     # Extract and print the main summary
 
 # Entry point for script execution — runs main on sample YouTube video
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)       # Show transcription stats (voiced ratio, timing)
     YOUTUBE_URL = "https://www.youtube.com/watch?v=h5id4erwD4s"
     main(YOUTUBE_URL)
@@ -0,0 +1,244 @@
+# Faster-whisper (CTranslate2) transcription
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import ctranslate2
+import numpy as np
+from faster_whisper import WhisperModel
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+logger = logging.getLogger(__name__)
+
+WHISPER_MODEL = "medium"                        # Whisper model size
+SAMPLE_RATE = 16000                             # Whisper expects 16kHz mono audio
+STREAM_CHUNK_SECONDS = 5                        # Audio read from ffmpeg per step
+STREAM_WINDOW_SECONDS = 30                      # Longest window transcribed at once (one Whisper encoder pass)
+STREAM_PROMPT_CHARS = 200                       # Tail of the previous window's text passed as context to the next
+VAD_PARAMETERS = {"min_silence_duration_ms": 500}  # Silero VAD: cut silences longer than half a second
+
+GPU_COMPUTE_TYPES = ("int8_float16", "float16")  # Preferred CUDA compute types, fastest first
+
+
+def resolve_device(device: str = "auto") -> Tuple[str, str]:
+    """
+    Picks the CTranslate2 device and the fastest compute type it supports.
+
+    On CUDA this is int8_float16 (int8 weights, FP16 activations) where the GPU has
+    int8 tensor cores, else FP16; the CPU falls back to int8.
+
+    Args:
+        device (str): "cuda", "cpu" or "auto" (CUDA when a GPU is visible).
+
+    Returns:
+        Tuple[str, str]: The device and compute type.
+    """
+    if device == "auto":
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    if device == "cuda":
+        supported = ctranslate2.get_supported_compute_types("cuda")
+        compute_type = next((ct for ct in GPU_COMPUTE_TYPES if ct in supported), "float32")
+    else:
+        compute_type = "int8"
+    return device, compute_type
+
+
+async def _stream_pcm(url: str, chunk_seconds: int = STREAM_CHUNK_SECONDS) -> AsyncIterator[np.ndarray]:
+    """
+    Streams a YouTube video's audio as 16kHz mono float32 chunks while it downloads.
+
+    yt-dlp writes the best audio stream to a pipe that ffmpeg decodes to raw PCM, so
+    transcription can start before the download has finished.
+
+    Args:
+        url (str): The YouTube video URL.
+        chunk_seconds (int): Length of each yielded chunk in seconds.
+
+    Yields:
+        np.ndarray: The next chunk of audio samples (the last one may be shorter).
+    """
+    read_fd, write_fd = os.pipe()
+    processes = []
+    try:
+        try:
+            processes.append(await asyncio.create_subprocess_exec(
+                "yt-dlp", "--quiet", "--format", "bestaudio", "--output", "-", url,
+                stdout=write_fd,
+            ))
+            processes.append(await asyncio.create_subprocess_exec(
+                "ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1",
+                "pipe:1",
+                stdin=read_fd, stdout=asyncio.subprocess.PIPE,
+            ))
+        finally:
+            os.close(read_fd)                    # The subprocesses hold their own copies of the pipe ends
+            os.close(write_fd)
+        downloader, decoder = processes
+
+        chunk_bytes = SAMPLE_RATE * chunk_seconds * 2   # 2 bytes per s16le sample
+        while True:
+            try:
+                raw = await decoder.stdout.readexactly(chunk_bytes)
+            except asyncio.IncompleteReadError as e:
+                raw = e.partial                  # End of stream: flush whatever is left
+            if not raw:
+                break
+            yield np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+            if len(raw) < chunk_bytes:
+                break
+
+        if await downloader.wait() != 0:
+            raise RuntimeError(f"yt-dlp failed to download audio from {url}")
+        if await decoder.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode audio from {url}")
+    finally:
+        # Reap the children if the consumer stopped early or something above failed
+        for process in processes:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+class FasterWhisperTranscriber:
+    """Speech-to-text with Whisper running on faster-whisper (CTranslate2)."""
+
+    def __init__(self, model_name_or_path: str = WHISPER_MODEL, device: str = "auto",
+                 compute_type: Optional[str] = None, beam_size: int = 1, vad_filter: bool = True,
+                 vad_parameters: Optional[Dict] = None, condition_on_previous_text: bool = False):
+        """
+        Args:
+            model_name_or_path (str): Whisper model size or path to a converted CTranslate2 model.
+            device (str): "cuda", "cpu" or "auto" (CUDA when available).
+            compute_type (Optional[str]): CTranslate2 quantization, e.g. "int8_float16"; if None,
+                the fastest type supported by the device is used.
+            beam_size (int): Beam width; 1 means greedy decoding.
+            vad_filter (bool): If True, skip non-speech audio with the built-in Silero VAD.
+            vad_parameters (Optional[Dict]): Silero VAD options; defaults to VAD_PARAMETERS.
+            condition_on_previous_text (bool): If True, feed the previous window's text as a prompt.
+        """
+        device, default_compute_type = resolve_device(device)
+        self.model = WhisperModel(model_name_or_path, device=device, compute_type=compute_type or default_compute_type)
+        self.beam_size = beam_size
+        self.vad_filter = vad_filter
+        self.vad_parameters = vad_parameters if vad_parameters is not None else dict(VAD_PARAMETERS)
+        self.condition_on_previous_text = condition_on_previous_text
+
+    def transcribe(self, audio) -> str:
+        """
+        Transcribes an audio file path (or 16kHz mono float array) to text.
+
+        Args:
+            audio: Path to the audio file, or the decoded waveform.
+
+        Returns:
+            str: The full transcript.
+        """
+        start = time.perf_counter()
+        segments, info = self.model.transcribe(
+            audio,
+            beam_size=self.beam_size,
+            vad_filter=self.vad_filter,
+            vad_parameters=self.vad_parameters,
+            condition_on_previous_text=self.condition_on_previous_text,
+        )
+        if self.vad_filter and info.duration:
+            logger.info("voiced_ratio=%.2f", info.duration_after_vad / info.duration)
+        text = "".join(segment.text for segment in segments).strip()   # Segments are decoded lazily
+        logger.info("Transcribed %.1fs of audio in %.1fs", info.duration, time.perf_counter() - start)
+        return text
+
+    def _window_cut(self, buffer: np.ndarray, window_samples: int) -> int:
+        """Returns where to end the next window: at the last silence in it, else at its full length."""
+        if len(buffer) <= window_samples:
+            return len(buffer)
+        speech = get_speech_timestamps(buffer[:window_samples], VadOptions(**self.vad_parameters))
+        ends = [chunk["end"] for chunk in speech if chunk["end"] < window_samples]
+        if not ends or ends[-1] < window_samples // 2:
+            return window_samples                # All silence, or no usable pause: cut at the window limit
+        return ends[-1]
+
+    def _transcribe_window(self, audio: np.ndarray, prompt: str) -> Tuple[str, float, float]:
+        """Returns the window's text, its duration and how many seconds of it the VAD kept."""
+        segments, info = self.model.transcribe(
+            audio,
+            beam_size=self.beam_size,
+            vad_filter=self.vad_filter,
+            vad_parameters=self.vad_parameters,
+            condition_on_previous_text=self.condition_on_previous_text,
+            initial_prompt=prompt or None,       # Carries the previous window's text across the cut
+        )
+        text = "".join(segment.text for segment in segments).strip()   # Segments are decoded lazily
+        return text, info.duration, info.duration_after_vad if self.vad_filter else info.duration
+
+    async def _transcribe_stream(self, url: str) -> str:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        window_samples = STREAM_WINDOW_SECONDS * SAMPLE_RATE
+        audio_seconds = voiced_seconds = 0.0
+        buffer = np.zeros(0, dtype=np.float32)
+        texts = []
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def read():
+            # Keep draining ffmpeg into the queue so the download continues while a window is transcribed
+            stream = _stream_pcm(url)
+            try:
+                async for chunk in stream:
+                    chunks.put_nowait(chunk)
+            finally:
+                await stream.aclose()            # Reaps yt-dlp/ffmpeg on errors and cancellation
+                chunks.put_nowait(None)          # End-of-stream marker
+
+        reader = asyncio.create_task(read())
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is not None:
+                    buffer = np.concatenate([buffer, chunk])
+                # Transcribe each full window exactly once; at end of stream also the remainder
+                while len(buffer) >= window_samples or (chunk is None and len(buffer)):
+                    cut = self._window_cut(buffer, window_samples)
+                    window, buffer = buffer[:cut], buffer[cut:]
+                    prompt = " ".join(texts)[-STREAM_PROMPT_CHARS:]
+                    text, duration, voiced = await loop.run_in_executor(
+                        None, self._transcribe_window, window, prompt
+                    )
+                    texts.append(text)
+                    audio_seconds += duration
+                    voiced_seconds += voiced
+                if chunk is None:
+                    break
+            await reader                         # Surfaces yt-dlp/ffmpeg failures
+        finally:
+            if not reader.done():
+                reader.cancel()
+                try:
+                    await reader
+                except asyncio.CancelledError:
+                    pass
+
+        if self.vad_filter and audio_seconds:
+            logger.info("voiced_ratio=%.2f", voiced_seconds / audio_seconds)
+        logger.info("Transcribed %.1fs of audio in %.1fs", audio_seconds, time.perf_counter() - start)
+        return " ".join(text for text in texts if text)
+
+    def transcribe_stream(self, url: str) -> str:
+        """
+        Transcribes a YouTube video while its audio is still downloading.
+
+        The audio is cut into windows of up to 30s, ending at a VAD-detected pause where
+        possible. Each window is transcribed once, with the tail of the previous window's
+        text as its prompt, while the rest of the audio keeps downloading.
+
+        Args:
+            url (str): The YouTube video URL.
+
+        Returns:
+            str: The full transcript.
+
+        Raises:
+            RuntimeError: If yt-dlp fails to download or ffmpeg fails to decode the audio.
+        """
+        return asyncio.run(self._transcribe_stream(url))
@@ -1,63 +1,103 @@
 import streamlit as st
-from pytube import YouTube
-from haystack.nodes import PromptNode, PromptModel
-from haystack.nodes.audio import WhisperTranscriber
-from haystack.pipelines import Pipeline
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import ctranslate2
+import yt_dlp
+from llama_cpp import llama_supports_gpu_offload
+from cache import audio_path, load_summary, load_transcript, model_hash, prompt_hash, save_summary, save_transcript, video_id
+from transcriber import FasterWhisperTranscriber
 from model_add import LlamaCPPInvocationLayer
+from summary import SUMMARY_PROMPT, summarize_transcript
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import shutil
+import subprocess
 import time
 import os
 
 # Streamlit page setup
 st.set_page_config(page_title="YouTube Summarizer", layout="wide")
 
+# Default to GPU inference whenever a CUDA device or a GPU-enabled llama.cpp build is present
+USE_GPU = ctranslate2.get_cuda_device_count() > 0 or llama_supports_gpu_offload()
+
 # ----------------- Utility Functions -----------------
 
 def download_audio(url: str) -> str:
     """Download audio stream from YouTube video."""
+    options = {
+        "format": "bestaudio[ext=m4a]/bestaudio",
+        "outtmpl": "audio_%(id)s.%(ext)s",
+        "concurrent_fragment_downloads": 8,
+        "quiet": True,
+    }
+    if shutil.which("aria2c"):  # Parallel chunked HTTP when aria2c is installed
+        options["external_downloader"] = {"default": "aria2c"}
     try:
-        yt = YouTube(url)
-        audio_stream = yt.streams.filter(only_audio=True).first()
-        file_path = audio_stream.download(filename_prefix="audio_")
+        with yt_dlp.YoutubeDL(options) as ydl:
+            info = ydl.extract_info(url, download=True)
+            file_path = ydl.prepare_filename(info)
         return file_path
     except Exception as e:
         st.error(f"Error downloading YouTube audio: {e}")
         return None
 
 
-def load_model(model_path: str):
-    """Initialize Llama 2 model."""
-    if not os.path.exists(model_path):
-        st.error(f"Model not found at {model_path}")
+def convert_audio(file_path: str, wav_path: str) -> str:
+    """Convert audio to 16kHz mono PCM WAV (Whisper's input format) in one ffmpeg pass."""
+    tmp_path = f"{wav_path}.tmp"  # Only a complete conversion may land at the cached path
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", file_path, "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le",
+             "-f", "wav", tmp_path],
+            check=True,
+        )
+        os.replace(tmp_path, wav_path)
+        return wav_path
+    except (OSError, subprocess.CalledProcessError) as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        st.error(f"Error converting audio: {e}")
         return None
-    model = PromptModel(
-        model_name_or_path=model_path,
-        invocation_layer_class=LlamaCPPInvocationLayer,
-        use_gpu=False,
-        max_length=512,
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)   # Keep one set of weights in memory
+def load_model(model_path: str, draft_path: str = None, use_gpu: bool = USE_GPU):
+    """Initialize Llama 2 model (cached across Streamlit reruns)."""
+    return LlamaCPPInvocationLayer(
+        model_path, use_gpu=use_gpu, draft_path=draft_path, prompt_template=SUMMARY_PROMPT
     )
-    return model
 
 
-def build_prompt_node(model):
-    """Initialize Haystack prompt node for summarization."""
-    template = "deepset/summarization"
-    return PromptNode(model_name_or_path=model, default_prompt_template=template, use_gpu=False)
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_transcriber(use_gpu: bool = USE_GPU):
+    """Initialize the Whisper model (cached across Streamlit reruns)."""
+    return FasterWhisperTranscriber(device="auto" if use_gpu else "cpu")
 
 
-def summarize_audio(file_path: str, prompt_node):
-    """Run Whisper transcription + Llama summarization pipeline."""
-    whisper = WhisperTranscriber()
-    pipe = Pipeline()
-    pipe.add_node(component=whisper, name="whisper", inputs=["File"])
-    pipe.add_node(component=prompt_node, name="prompt", inputs=["whisper"])
-    return pipe.run(file_paths=[file_path])
+def get_transcript(vid: str, use_gpu: bool = USE_GPU) -> str:
+    """Return the cached transcript, or download and transcribe the video with Whisper."""
+    transcript = load_transcript(vid)
+    if transcript is None:
+        wav_path = str(audio_path(vid))
+        if not os.path.exists(wav_path):
+            file_path = download_audio(f"https://www.youtube.com/watch?v={vid}")
+            if not file_path:
+                return None
+            converted = convert_audio(file_path, wav_path)
+            os.remove(file_path)                 # The cached WAV replaces the original download
+            if not converted:
+                return None
+        transcript = load_transcriber(use_gpu).transcribe(wav_path)
+        if transcript:
+            save_transcript(vid, transcript)
+    return transcript
 
 
 # ----------------- Main Streamlit App -----------------
 
 def main():
     st.title("🎥 YouTube Video Summarizer")
-    st.markdown("#### Built with **Llama 2**, **Whisper**, **Haystack**, and **Streamlit**")
+    st.markdown("#### Built with **Llama 2**, **Whisper**, and **Streamlit**")
 
     with st.expander("ℹ️ About this App"):
         st.write(
@@ -73,24 +113,53 @@ def main():
 
     model_path = st.text_input(
         "Enter Llama 2 model path",
-        value="llama-2-7b-32k-instruct.Q4_K_S.gguf",
+        value="llama-2-7b-32k-instruct.Q4_K_M.gguf",
         help="Path to your local GGUF model file.",
     )
 
+    draft_path = st.text_input(
+        "Draft model path (optional)",
+        help="Small GGUF model with the same vocabulary (e.g. TinyLlama-1.1B) used for speculative decoding.",
+    )
+
+    use_gpu = st.toggle("Use GPU", value=USE_GPU, help="Run Whisper and Llama 2 on the GPU.")
+
     if st.button("Submit") and youtube_url:
         start = time.time()
 
-        st.info("Downloading and processing video...")
-        file_path = download_audio(youtube_url)
-        if not file_path:
+        try:
+            vid = video_id(youtube_url)
+        except ValueError as e:
+            st.error(str(e))
             return
-
-        model = load_model(model_path)
-        if not model:
+        if not os.path.exists(model_path):
+            st.error(f"Model not found at {model_path}")
+            return
+        if draft_path and not os.path.exists(draft_path):
+            st.error(f"Draft model not found at {draft_path}")
             return
 
-        prompt_node = build_prompt_node(model)
-        result = summarize_audio(file_path, prompt_node)
+        # Reruns on the same video, model and prompt are served from the disk cache
+        summary_key = (vid, model_hash(model_path), prompt_hash(SUMMARY_PROMPT))
+        summary_text = load_summary(*summary_key)
+        if summary_text is None:
+            st.info("Downloading and processing video...")
+            # Load the model on a worker thread so it overlaps with the download and transcription
+            executor = ThreadPoolExecutor(
+                max_workers=1, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())
+            )
+            model_future = executor.submit(load_model, model_path, draft_path or None, use_gpu)
+            executor.shutdown(wait=False)
+
+            transcript = get_transcript(vid, use_gpu)
+            if not transcript:
+                return
+
+            model = model_future.result()
+
+            summary_text = summarize_transcript(transcript, model)
+            if summary_text:
+                save_summary(*summary_key, summary_text)
 
         end = time.time()
         elapsed = end - start
@@ -101,14 +170,14 @@ def main():
             st.video(youtube_url)
         with col2:
             st.header("Summary")
-            try:
-                summary_text = result["results"][0].split("\n\n[INST]")[0]
+            summary_text = summary_text.partition("\n\n[INST]")[0]
+            if summary_text:
                 st.success(summary_text)
-            except Exception:
-                st.warning("Summary extraction failed. Full output below:")
-                st.write(result)
+            else:
+                st.warning("The model produced an empty summary.")
             st.caption(f"⏱️ Processing time: {elapsed:.2f} seconds")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)  # Show transcription stats (voiced ratio, timing) in the server log
     main()